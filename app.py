@@ -1,14 +1,27 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, abort, jsonify, request, render_template, send_file, send_from_directory, stream_with_context, url_for
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
 from flask_wtf.csrf import CSRFProtect
 from functools import wraps
 from urllib.parse import urlparse
+import gzip
+import hashlib
+import json
 import logging
-from rezka_client import get_popular_movies, get_movie_details, get_movie_stream, search_movies, RezkaClient
+import mimetypes
+from rezka_client import get_popular_movies, get_movie_details, get_movie_stream, search_movies, iter_search_movies, RezkaClient
 from hdrezka_api import HdRezkaApi
+from catalog import Catalog, CatalogCrawler, SORT_FIELDS
+from details_resolver import DetailsResolver
+from poster_cache import PosterCache
 import os
+import requests
+
+try:
+    import brotli
+except ImportError:  # Без brotli ответы сжимаются только gzip
+    brotli = None
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -16,8 +29,41 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
-app.config['CACHE_TYPE'] = 'SimpleCache'
 app.config['CACHE_DEFAULT_TIMEOUT'] = 300
+# С REDIS_URL кэш и лимиты общие для всех воркеров и узлов, без него - в памяти процесса
+app.config['REDIS_URL'] = os.environ.get('REDIS_URL')
+if app.config['REDIS_URL']:
+    app.config['CACHE_TYPE'] = 'shared_cache.TwoTierCache'
+    app.config['CACHE_REDIS_URL'] = app.config['REDIS_URL']
+    app.config['CACHE_KEY_PREFIX'] = 'filmora:'
+    app.config['CACHE_L1_TIMEOUT'] = int(os.environ.get('CACHE_L1_TIMEOUT', '30'))
+    app.config['RATELIMIT_STORAGE_URI'] = app.config['REDIS_URL']
+    # Пока Redis недоступен, лимиты считаются в памяти процесса, а не дают 500
+    app.config['RATELIMIT_SWALLOW_ERRORS'] = True
+    app.config['RATELIMIT_IN_MEMORY_FALLBACK_ENABLED'] = True
+else:
+    app.config['CACHE_TYPE'] = 'cache_snapshot.SnapshotCache'
+    app.config['CACHE_SNAPSHOT_PATH'] = os.environ.get('CACHE_SNAPSHOT_PATH', 'cache.snapshot')
+    app.config['CACHE_SNAPSHOT_INTERVAL'] = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL', '60'))
+    app.config['RATELIMIT_STORAGE_URI'] = 'memory://'
+app.config['DETAILS_BATCH_SIZE'] = 20
+app.config['DETAILS_BATCH_TIMEOUT'] = 10
+app.config['DETAILS_WORKERS'] = 4
+app.config['POSTER_CACHE_DIR'] = os.environ.get('POSTER_CACHE_DIR', 'poster_cache')
+app.config['POSTER_CACHE_MAX_BYTES'] = int(os.environ.get('POSTER_CACHE_MAX_MB', '512')) * 1024 * 1024
+app.config['POSTER_HOSTS'] = os.environ.get(
+    'POSTER_HOSTS', 'hdrezka.ag,rezka.ag,hdrezka.ac,statichdrezka.ac,flymaterez.net'
+).split(',')
+app.config['POSTER_MAX_AGE'] = 30 * 24 * 3600
+# Загрузки постеров с сайта (промахи кэша) с одного адреса
+app.config['POSTER_MISS_LIMIT'] = os.environ.get('POSTER_MISS_LIMIT', '300 per minute')
+app.config['SNAPSHOT_DIR'] = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+app.config['ASSET_DIR'] = os.path.join(app.static_folder, 'dist')
+app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['CATALOG_PATH'] = os.environ.get('CATALOG_PATH', 'catalog.db')
+app.config['CATALOG_CRAWLER'] = os.environ.get('CATALOG_CRAWLER', '0') == '1'
+app.config['CATALOG_CRAWL_INTERVAL'] = float(os.environ.get('CATALOG_CRAWL_INTERVAL', '2.0'))
 
 # Инициализация расширений
 csrf = CSRFProtect(app)
@@ -25,12 +71,29 @@ cache = Cache(app)
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=["60 per minute"]
+    default_limits=["60 per minute"],
+    storage_uri=app.config['RATELIMIT_STORAGE_URI']
 )
 
 # Создаем единственный экземпляр клиента
 rezka_client = RezkaClient()
 
+# Данные о фильмах (включая сезоны) кэшируются по URL и загружаются ограниченным пулом
+details_resolver = DetailsResolver(cache, get_movie_details, timeout=300, max_workers=app.config['DETAILS_WORKERS'])
+
+# Дисковый кэш постеров для маршрута /poster
+poster_cache = PosterCache(
+    app.config['POSTER_CACHE_DIR'],
+    max_bytes=app.config['POSTER_CACHE_MAX_BYTES'],
+    allowed_hosts=app.config['POSTER_HOSTS']
+)
+
+# Локальный каталог карточек; при нескольких воркерах краулер запускается только в одном из них
+catalog = Catalog(app.config['CATALOG_PATH'])
+catalog_crawler = CatalogCrawler(catalog, request_interval=app.config['CATALOG_CRAWL_INTERVAL'])
+if app.config['CATALOG_CRAWLER']:
+    catalog_crawler.start()
+
 def validate_url(url):
     """Проверка валидности URL"""
     try:
@@ -39,6 +102,104 @@ def validate_url(url):
     except Exception:
         return False
 
+def get_int_arg(name, default=None, minimum=None, maximum=None):
+    """Получение целочисленного параметра запроса с ограничением диапазона"""
+    value = request.args.get(name, type=int)
+    if value is None:
+        return default
+    if minimum is not None:
+        value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+def ndjson_response(movies, cache_key=None):
+    """Отдает карточки построчно (NDJSON) по мере их получения; полный список кладется в кэш"""
+    def generate():
+        collected = []
+        try:
+            for movie in movies:
+                collected.append(movie)
+                yield json.dumps(movie, ensure_ascii=False) + '\n'
+        except Exception as e:
+            logger.error(f"Error in stream: {str(e)}")
+            yield json.dumps({'error': str(e), 'status': 'error'}, ensure_ascii=False) + '\n'
+            return
+        if cache_key:
+            cache.set(cache_key, collected)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def send_precompressed(directory, filename, mimetype=None, max_age=None):
+    """Отдает заранее сжатый вариант файла (.br/.gz), если клиент его принимает"""
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(
+                directory, filename + suffix,
+                mimetype=mimetype or mimetypes.guess_type(filename)[0],
+                max_age=max_age
+            )
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(directory, filename, max_age=max_age)
+    # Несжатый ответ тоже зависит от Accept-Encoding, иначе прокси отдаст его всем
+    response.vary.add('Accept-Encoding')
+    return response
+
+def load_asset_manifest():
+    """Манифест бандлов из build_assets.py; пустой, если сборки нет"""
+    try:
+        with open(os.path.join(app.config['ASSET_DIR'], 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)['bundles']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+asset_manifest = load_asset_manifest()
+# Версия сборки в ключе кэша страницы: после пересборки восстановленный из снимка или Redis
+# HTML не должен ссылаться на удаленные бандлы
+asset_version = hashlib.sha256(json.dumps(asset_manifest, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+@app.context_processor
+def asset_helpers():
+    def asset_urls(name, sources):
+        """URL бандла с хэшем или исходных файлов, если сборка не выполнялась"""
+        if name in asset_manifest:
+            return [url_for('assets', filename=asset_manifest[name])]
+        return [url_for('static', filename=source) for source in sources]
+    return {'asset_urls': asset_urls}
+
+@app.after_request
+def compress_response(response):
+    """Сжатие JSON-ответов больше COMPRESS_MIN_SIZE с выбором кодировки по Accept-Encoding"""
+    if (
+        response.mimetype != 'application/json'
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if brotli is not None and 'br' in request.accept_encodings:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 def handle_error(func):
     """Декоратор для обработки ошибок"""
     @wraps(func)
@@ -54,10 +215,30 @@ def handle_error(func):
             }), 500
     return wrapper
 
+@cache.cached(timeout=300, key_prefix=f'index_html/{asset_version}')
+def render_index():
+    html = render_template('index.html')
+    return html, hashlib.sha256(html.encode('utf-8')).hexdigest()[:16]
+
 @app.route('/')
-@cache.cached(timeout=300)
 def index():
-    return render_template('index.html')
+    html, etag = render_index()
+    response = Response(html, mimetype='text/html')
+    # Страница всегда перепроверяется, но без изменений отвечаем 304
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/assets/<path:filename>')
+@limiter.exempt
+def assets(filename):
+    """Бандлы с хэшем в имени: содержимое по URL не меняется, кэшируются навсегда"""
+    # Отдаем только бандлы из манифеста, а не manifest.json и другие файлы без хэша
+    if filename not in asset_manifest.values():
+        abort(404)
+    response = send_precompressed(app.config['ASSET_DIR'], filename, max_age=app.config['ASSET_MAX_AGE'])
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/popular')
 @cache.cached(timeout=300)
@@ -78,7 +259,6 @@ def search():
     return jsonify(movies)
 
 @app.route('/movie/details')
-@cache.memoize(timeout=300)
 @handle_error
 def movie_details():
     url = request.args.get('url', '').strip()
@@ -88,12 +268,90 @@ def movie_details():
     if not validate_url(url):
         return jsonify({'error': 'Некорректный URL'}), 400
         
-    details = get_movie_details(url)
+    details = details_resolver.get(url)
     if not details:
         return jsonify({'error': 'Не удалось получить информацию о фильме'}), 404
         
     return jsonify(details)
 
+def get_batch_urls():
+    """URL пакетного запроса без повторов, в исходном порядке"""
+    return list(dict.fromkeys(url.strip() for url in request.args.getlist('url') if url.strip()))
+
+def details_batch_cost():
+    """Пакет расходует лимит по числу URL, которые придется загружать с сайта"""
+    if request.args.get('cached') == '1':
+        return 1
+    urls = [url for url in get_batch_urls()[:app.config['DETAILS_BATCH_SIZE']] if validate_url(url)]
+    return max(details_resolver.count_uncached(urls), 1)
+
+@app.route('/movie/details/batch')
+@limiter.limit("60 per minute", cost=details_batch_cost)
+@handle_error
+def movie_details_batch():
+    """
+    Данные о нескольких фильмах сразу: /movie/details/batch?url=...&url=...
+    С cached=1 только читает кэш (после подсказок /movie/details/prefetch), не запуская загрузок
+    """
+    urls = get_batch_urls()
+    if not urls:
+        return jsonify({'error': 'URL не указан'}), 400
+    if len(urls) > app.config['DETAILS_BATCH_SIZE']:
+        return jsonify({'error': f"Не более {app.config['DETAILS_BATCH_SIZE']} URL за запрос"}), 400
+
+    valid_urls = [url for url in urls if validate_url(url)]
+    resolved = details_resolver.get_many(
+        valid_urls,
+        timeout=app.config['DETAILS_BATCH_TIMEOUT'],
+        cached_only=request.args.get('cached') == '1'
+    )
+
+    results = []
+    for url in urls:
+        status, details = resolved.get(url, ('invalid', None))
+        item = {'url': url, 'status': status}
+        if details:
+            item['details'] = details
+        results.append(item)
+    return jsonify({'results': results})
+
+@app.route('/movie/details/prefetch')
+@limiter.limit("120 per minute")
+@handle_error
+def movie_details_prefetch():
+    """Подсказка о скором открытии фильма: данные загружаются в фоне"""
+    url = request.args.get('url', '').strip()
+    if not url or not validate_url(url):
+        return jsonify({'error': 'Некорректный URL'}), 400
+
+    queued = details_resolver.prefetch(url)
+    return jsonify({'url': url, 'queued': queued}), 202
+
+def poster_is_cached():
+    """Постеры с диска лимит не расходуют: страница запрашивает их десятками"""
+    url = request.args.get('url', '').strip()
+    return bool(url) and poster_cache.has(url, request.args.get('w', type=int))
+
+@app.route('/poster')
+@limiter.limit(lambda: app.config['POSTER_MISS_LIMIT'], exempt_when=poster_is_cached)
+@handle_error
+def poster():
+    """Прокси постеров: /poster?url=...&w=300"""
+    url = request.args.get('url', '').strip()
+    if not url or not validate_url(url):
+        return jsonify({'error': 'Некорректный URL'}), 400
+
+    try:
+        path, etag, mimetype = poster_cache.get(url, request.args.get('w', type=int))
+    except (ValueError, requests.RequestException) as e:
+        logger.error(f"Error in poster: {str(e)}")
+        return jsonify({'error': 'Постер недоступен'}), 404
+
+    # send_file отдает файл через wsgi.file_wrapper (sendfile) и сам отвечает 304 по If-None-Match
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True, max_age=app.config['POSTER_MAX_AGE'])
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/movie/stream')
 @limiter.limit("60 per minute")
 @handle_error
@@ -192,5 +450,75 @@ def new_movies():
     movies = rezka_client.get_movies('new')
     return jsonify(movies)
 
+@app.route('/stream/<category>')
+@limiter.limit("60 per minute")
+@handle_error
+def stream_movies(category):
+    """Потоковая выдача списков и поиска в формате NDJSON"""
+    if category == 'search':
+        query = request.args.get('query', '').strip()
+        if not query:
+            return jsonify({'error': 'Поисковый запрос не может быть пустым'}), 400
+        return ndjson_response(iter_search_movies(query))
+
+    if category not in ('popular', 'now', 'new'):
+        return jsonify({'error': f'Неизвестная категория: {category}'}), 404
+
+    cache_key = f'stream/{category}'
+    movies = cache.get(cache_key)
+    if movies is not None:
+        return ndjson_response(movies)
+    return ndjson_response(rezka_client.stream_movies(category), cache_key)
+
+@app.route('/snapshots/<path:filename>')
+@limiter.exempt
+def snapshots(filename):
+    """
+    Раздача снимков из export_snapshots.py для запуска без Nginx.
+    В продакшене этот путь обслуживает Nginx/CDN (gzip_static/brotli_static).
+    """
+    return send_precompressed(os.path.abspath(app.config['SNAPSHOT_DIR']), filename)
+
+@app.route('/catalog/search')
+@handle_error
+def catalog_search():
+    """Поиск по локальному каталогу без обращения к сайту"""
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({'error': 'Поисковый запрос не может быть пустым'}), 400
+
+    movies = catalog.search(
+        query,
+        limit=get_int_arg('limit', 20, 1, 100),
+        offset=get_int_arg('offset', 0, 0)
+    )
+    return jsonify(movies)
+
+@app.route('/catalog/movies')
+@handle_error
+def catalog_movies():
+    """Список фильмов из каталога с фильтрацией по типу, году и рейтингу"""
+    sort = request.args.get('sort', 'rating')
+    if sort not in SORT_FIELDS:
+        return jsonify({'error': f'Некорректное поле сортировки: {sort}'}), 400
+
+    year = request.args.get('year', type=int)
+    movies = catalog.list_movies(
+        movie_type=request.args.get('type') or None,
+        year_from=year or request.args.get('year_from', type=int),
+        year_to=year or request.args.get('year_to', type=int),
+        min_rating=request.args.get('min_rating', type=float),
+        sort=sort,
+        order=request.args.get('order', 'desc'),
+        limit=get_int_arg('limit', 20, 1, 100),
+        offset=get_int_arg('offset', 0, 0)
+    )
+    return jsonify(movies)
+
+@app.route('/catalog/status')
+@handle_error
+def catalog_status():
+    return jsonify(catalog.stats())
+
 if __name__ == '__main__':
     app.run(debug=False)
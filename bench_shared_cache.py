@@ -0,0 +1,100 @@
+"""
+Бенчмарк локального и общего (L1/L2) кэша и лимитов при росте числа воркеров.
+
+Запускает resp_server.py в фоне и N процессов-воркеров. Общий поток запросов
+(ключи с распределением Ципфа, как популярность фильмов) делится между
+воркерами поровну; промах кэша имитирует обращение к сайту задержкой
+--upstream-ms. Для лимитов все воркеры принимают запросы одного клиента
+с лимитом "60 per minute".
+
+Запуск: python bench_shared_cache.py --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from limits import parse, storage, strategies
+from flask_caching.backends.simplecache import SimpleCache
+import resp_server
+from shared_cache import TwoTierCache
+
+def zipf_keys(count, keys, seed):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, keys + 1)]
+    return rng.choices(range(keys), weights=weights, k=count)
+
+def cache_worker(mode, redis_url, requests, keys, upstream_ms, seed, results):
+    if mode == 'local':
+        cache = SimpleCache(threshold=keys * 2)
+    else:
+        cache = TwoTierCache(redis_url=redis_url, l1_threshold=keys * 2)
+
+    hits = 0
+    latencies = []
+    for key in zipf_keys(requests, keys, seed):
+        start = time.perf_counter()
+        value = cache.get(f'movie/{key}')
+        if value is None:
+            time.sleep(upstream_ms / 1000)
+            cache.set(f'movie/{key}', {'id': key, 'title': 'x' * 200}, timeout=300)
+        else:
+            hits += 1
+        latencies.append(time.perf_counter() - start)
+    results.put((hits, latencies))
+
+def limit_worker(uri, attempts, results):
+    limiter = strategies.FixedWindowRateLimiter(storage.storage_from_string(uri))
+    item = parse('60/minute')
+    results.put(sum(limiter.hit(item, 'client') for _ in range(attempts)))
+
+def run(target, args_list):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=target, args=args + (results,)) for args in args_list]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк общего кэша и лимитов')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=4000, help='Всего запросов на все воркеры')
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--upstream-ms', type=float, default=5)
+    parser.add_argument('--limit-attempts', type=int, default=200)
+    args = parser.parse_args()
+
+    server, port = resp_server.start_background()
+    redis_url = f'redis://127.0.0.1:{port}/0'
+
+    print(f"{'workers':>7} {'mode':>7} {'hit ratio':>10} {'mean ms':>8} {'p95 ms':>8}")
+    for workers in args.workers:
+        for mode in ('local', 'shared'):
+            server.store.data.clear()
+            server.store.expires.clear()
+            per_worker = args.requests // workers
+            collected = run(cache_worker, [
+                (mode, redis_url, per_worker, args.keys, args.upstream_ms, seed)
+                for seed in range(workers)
+            ])
+            hits = sum(hits for hits, _ in collected)
+            latencies = sorted(latency for _, worker_latencies in collected for latency in worker_latencies)
+            mean = sum(latencies) / len(latencies) * 1000
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000
+            print(f"{workers:>7} {mode:>7} {hits / len(latencies):>10.3f} {mean:>8.2f} {p95:>8.2f}")
+
+    print()
+    print(f"{'workers':>7} {'allowed (memory)':>17} {'allowed (shared)':>17}   limit 60/minute")
+    for workers in args.workers:
+        per_worker = args.limit_attempts // workers
+        local = sum(run(limit_worker, [('memory://', per_worker)] * workers))
+        server.store.data.clear()
+        shared = sum(run(limit_worker, [(redis_url, per_worker)] * workers))
+        print(f"{workers:>7} {local:>17} {shared:>17}")
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
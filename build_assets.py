@@ -0,0 +1,117 @@
+"""
+Сборка фронтенда: склейка JS/CSS (CSS еще и минифицируется), имена с хэшем
+содержимого и предварительно сжатые копии .gz/.br.
+
+JS не минифицируется: rjsmin не понимает шаблонные строки ES2015 и меняет
+их содержимое, а основную экономию дает сжатие.
+
+Результат пишется в static/dist/, а static/dist/manifest.json сопоставляет
+логическое имя бандла с файлом. Шаблон подключает бандлы через asset_urls()
+из app.py; пока сборки нет, подключаются исходные файлы.
+
+Запуск: python build_assets.py
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # Без brotli пишутся только .gz
+    brotli = None
+
+try:
+    from rcssmin import cssmin
+except ImportError:  # Без минификатора CSS только склеивается
+    cssmin = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Логическое имя бандла -> исходные файлы относительно static/
+BUNDLES = {
+    # Те же файлы, что подключает шаблон без сборки (asset_urls в index.html)
+    'app.js': ['js/main.js'],
+    'app.css': ['css/style.css']
+}
+
+def minify(name, source):
+    if name.endswith('.css') and cssmin is not None:
+        return cssmin(source)
+    return source
+
+def build_bundle(name, sources):
+    """
+    Собирает один бандл
+    :return: (имя файла с хэшем, размеры: исходные, после минификации, gzip, brotli)
+    """
+    parts = []
+    raw_size = 0
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), encoding='utf-8') as f:
+            text = f.read()
+        raw_size += len(text.encode('utf-8'))
+        parts.append(text)
+    # Точка с запятой между файлами защищает от склейки выражений на границе
+    separator = '\n;\n' if name.endswith('.js') else '\n'
+    data = minify(name, separator.join(parts)).encode('utf-8')
+
+    stem, ext = os.path.splitext(name)
+    filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+    path = os.path.join(DIST_DIR, filename)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    gzip_data = gzip.compress(data, compresslevel=9)
+    with open(f'{path}.gz', 'wb') as f:
+        f.write(gzip_data)
+    sizes = {'raw': raw_size, 'min': len(data), 'gzip': len(gzip_data), 'br': None}
+    if brotli is not None:
+        br_data = brotli.compress(data, quality=11)
+        with open(f'{path}.br', 'wb') as f:
+            f.write(br_data)
+        sizes['br'] = len(br_data)
+    return filename, sizes
+
+def build():
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    report = {}
+    for name, sources in BUNDLES.items():
+        manifest[name], report[name] = build_bundle(name, sources)
+
+    # Удаляем сборки прошлых версий
+    current = set(manifest.values())
+    for entry in os.scandir(DIST_DIR):
+        base = entry.name
+        for suffix in ('.gz', '.br'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if entry.is_file() and entry.name != 'manifest.json' and base not in current:
+            os.remove(entry.path)
+
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'bundles': manifest, 'report': report}, f, indent=2)
+    return manifest, report
+
+def print_report(report):
+    """Сколько байт экономится на загрузке страницы (все бандлы)"""
+    total = {'raw': 0, 'min': 0, 'gzip': 0, 'br': 0}
+    print(f"{'bundle':<10}{'raw':>10}{'min':>10}{'gzip':>10}{'br':>10}")
+    for name, sizes in report.items():
+        best = sizes['br'] or sizes['gzip']
+        print(f"{name:<10}{sizes['raw']:>10}{sizes['min']:>10}{sizes['gzip']:>10}{sizes['br'] or '-':>10}")
+        for key in ('raw', 'min', 'gzip'):
+            total[key] += sizes[key]
+        total['br'] += best
+    saved = total['raw'] - total['br']
+    print(f"{'total':<10}{total['raw']:>10}{total['min']:>10}{total['gzip']:>10}{total['br']:>10}")
+    print(f"Saved per page load: {saved} bytes ({saved * 100 // max(total['raw'], 1)}%)")
+
+if __name__ == '__main__':
+    manifest, report = build()
+    for name, filename in manifest.items():
+        print(f'{name} -> dist/{filename}')
+    print_report(report)
@@ -0,0 +1,193 @@
+import atexit
+import json
+import mmap
+import os
+import struct
+import threading
+import logging
+from time import time
+from flask_caching.backends.simplecache import SimpleCache
+
+logger = logging.getLogger(__name__)
+
+# Формат файла: MAGIC, значения подряд, JSON-индекс, трейлер (смещение и длина индекса)
+MAGIC = b'FLMSNAP1'
+TRAILER = struct.Struct('<QQ')
+
+class SnapshotCache(SimpleCache):
+    """
+    SimpleCache, который сохраняет свое содержимое на диск и поднимает его при старте.
+
+    Значения в SimpleCache уже хранятся сериализованными вместе с абсолютным
+    временем истечения, поэтому в снимок они пишутся как есть и сохраняют
+    оставшийся TTL. При загрузке читается только индекс, а сам файл
+    отображается в память: значение копируется в кэш при первом обращении
+    к ключу.
+
+    Снимок рассчитан на один процесс: несколько воркеров с общим snapshot_path
+    перезаписывают снимки друг друга. Для нескольких воркеров используйте
+    общий кэш (shared_cache.TwoTierCache).
+    """
+
+    def __init__(self, snapshot_path='cache.snapshot', snapshot_interval=60, **kwargs):
+        super().__init__(**kwargs)
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_file = None
+        self._snapshot_map = None
+        self._snapshot_index = {}
+        self._stop = threading.Event()
+        self._open_snapshot()
+
+        if snapshot_interval:
+            thread = threading.Thread(target=self._run, name='cache-snapshot', daemon=True)
+            thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            dict(
+                threshold=config['CACHE_THRESHOLD'],
+                ignore_errors=config['CACHE_IGNORE_ERRORS'],
+                snapshot_path=config.get('CACHE_SNAPSHOT_PATH', 'cache.snapshot'),
+                snapshot_interval=config.get('CACHE_SNAPSHOT_INTERVAL', 60),
+            )
+        )
+        return cls(*args, **kwargs)
+
+    def _open_snapshot(self):
+        """Отображает файл снимка в память и читает индекс без десериализации значений"""
+        self._close_snapshot()
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            self._snapshot_file = open(self.snapshot_path, 'rb')
+            self._snapshot_map = mmap.mmap(self._snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._snapshot_map[:len(MAGIC)] != MAGIC:
+                raise ValueError('Неизвестный формат снимка')
+
+            index_offset, index_length = TRAILER.unpack_from(
+                self._snapshot_map, len(self._snapshot_map) - TRAILER.size
+            )
+            index = json.loads(self._snapshot_map[index_offset:index_offset + index_length])
+            now = time()
+            self._snapshot_index = {
+                key: (expires, offset, length)
+                for key, expires, offset, length in index
+                if expires == 0 or expires > now
+            }
+            logger.info(f"Cache snapshot opened: {len(self._snapshot_index)} entries")
+        except Exception as e:
+            logger.error(f"Error opening cache snapshot: {str(e)}")
+            self._close_snapshot()
+
+    def _close_snapshot(self):
+        if self._snapshot_map is not None:
+            self._snapshot_map.close()
+        if self._snapshot_file is not None:
+            self._snapshot_file.close()
+        self._snapshot_map = None
+        self._snapshot_file = None
+        self._snapshot_index = {}
+
+    def _load_from_snapshot(self, key):
+        """Переносит значение из снимка в память при первом обращении"""
+        if key in self._cache or key not in self._snapshot_index:
+            return
+        with self._snapshot_lock:
+            entry = self._snapshot_index.pop(key, None)
+            if entry is None or self._snapshot_map is None:
+                return
+            expires, offset, length = entry
+            if expires == 0 or expires > time():
+                self._cache.setdefault(key, (expires, self._snapshot_map[offset:offset + length]))
+
+    def get(self, key):
+        self._load_from_snapshot(key)
+        return super().get(key)
+
+    def has(self, key):
+        self._load_from_snapshot(key)
+        return super().has(key)
+
+    def add(self, key, value, timeout=None):
+        self._load_from_snapshot(key)
+        return super().add(key, value, timeout)
+
+    def set(self, key, value, timeout=None):
+        self._snapshot_index.pop(key, None)
+        return super().set(key, value, timeout)
+
+    def delete(self, key):
+        in_snapshot = self._snapshot_index.pop(key, None) is not None
+        return super().delete(key) or in_snapshot
+
+    def clear(self):
+        with self._snapshot_lock:
+            self._snapshot_index = {}
+        return super().clear()
+
+    def save_snapshot(self):
+        """
+        Атомарно записывает все живые записи (из памяти и еще не загруженные из снимка)
+        :return: Количество сохраненных записей
+        """
+        with self._snapshot_lock:
+            now = time()
+            entries = [
+                (key, expires, value)
+                for key, (expires, value) in list(self._cache.items())
+                if expires == 0 or expires > now
+            ]
+            for key, (expires, offset, length) in list(self._snapshot_index.items()):
+                if key not in self._cache and (expires == 0 or expires > now):
+                    entries.append((key, expires, self._snapshot_map[offset:offset + length]))
+
+            # Уникальное имя, чтобы параллельные сохранения не писали в один файл
+            tmp_path = f'{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            index = []
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC)
+                offset = len(MAGIC)
+                for key, expires, value in entries:
+                    f.write(value)
+                    index.append((key, expires, offset, len(value)))
+                    offset += len(value)
+                index_data = json.dumps(index, separators=(',', ':')).encode('utf-8')
+                f.write(index_data)
+                f.write(TRAILER.pack(offset, len(index_data)))
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Неиспользованные записи старого снимка переносятся в новый индекс
+            pending = set(self._snapshot_index)
+            self._close_snapshot()
+            os.replace(tmp_path, self.snapshot_path)
+            if pending:
+                self._open_snapshot()
+                self._snapshot_index = {
+                    key: entry for key, entry in self._snapshot_index.items() if key in pending
+                }
+            return len(entries)
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                logger.error(f"Error saving cache snapshot: {str(e)}")
+
+    def close(self):
+        """Сохраняет снимок при завершении процесса"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        try:
+            saved = self.save_snapshot()
+            logger.info(f"Cache snapshot saved: {saved} entries")
+        except Exception as e:
+            logger.error(f"Error saving cache snapshot: {str(e)}")
+        finally:
+            self._close_snapshot()
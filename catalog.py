@@ -0,0 +1,384 @@
+import os
+import sqlite3
+import threading
+import time
+import re
+import logging
+from urllib.parse import urlparse
+from rezka_client import get_listing_page, BASE_URL
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка между процессами недоступна
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Разделы каталога, которые обходит краулер
+SECTIONS = {
+    'films': '/films/',
+    'series': '/series/',
+    'cartoons': '/cartoons/',
+    'animation': '/animation/'
+}
+
+# Поля, по которым разрешена сортировка
+SORT_FIELDS = {
+    'rating': 'rating',
+    'year': 'year',
+    'title': 'title COLLATE NOCASE',
+    'updated': 'updated_at'
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    poster TEXT,
+    quality TEXT,
+    year INTEGER,
+    rating REAL,
+    type TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_movies_year ON movies(year);
+CREATE INDEX IF NOT EXISTS idx_movies_rating ON movies(rating);
+CREATE INDEX IF NOT EXISTS idx_movies_type ON movies(type, rating);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    title, content='movies', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS movies_ai AFTER INSERT ON movies BEGIN
+    INSERT INTO movies_fts(rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_ad AFTER DELETE ON movies BEGIN
+    INSERT INTO movies_fts(movies_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_au AFTER UPDATE OF title ON movies BEGIN
+    INSERT INTO movies_fts(movies_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO movies_fts(rowid, title) VALUES (new.id, new.title);
+END;
+
+CREATE TABLE IF NOT EXISTS crawl_state (
+    section TEXT PRIMARY KEY,
+    next_page INTEGER NOT NULL DEFAULT 1,
+    passes INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+'''
+
+def get_movie_type(url):
+    """Определяет тип контента по первому сегменту пути ссылки"""
+    path = urlparse(url).path.strip('/')
+    section = path.split('/', 1)[0] if path else ''
+    return section if section in SECTIONS else None
+
+def _to_int(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _to_float(value):
+    try:
+        return float(str(value).replace(',', '.')) if value else None
+    except (TypeError, ValueError):
+        return None
+
+class Catalog:
+    """Локальный каталог карточек в SQLite с полнотекстовым индексом по названиям"""
+
+    def __init__(self, path='catalog.db'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        # Отдельное соединение на поток: sqlite3 не разделяет соединения между потоками
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_movie(row):
+        return {
+            'url': row['url'],
+            'title': row['title'],
+            'poster': row['poster'],
+            'quality': row['quality'],
+            'year': str(row['year']) if row['year'] else None,
+            'rating': str(row['rating']) if row['rating'] is not None else None,
+            'type': row['type']
+        }
+
+    def upsert_movies(self, movies):
+        """
+        Добавляет или обновляет карточки в каталоге
+        :param movies: Список карточек в формате парсера rezka_client
+        :return: Количество новых карточек
+        """
+        now = time.time()
+        rows = [
+            (
+                movie['url'],
+                movie['title'],
+                movie.get('poster'),
+                movie.get('quality'),
+                _to_int(movie.get('year')),
+                _to_float(movie.get('rating')),
+                movie.get('type') or get_movie_type(movie['url']),
+                now
+            )
+            for movie in movies
+            if movie.get('url') and movie.get('title')
+        ]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with self._write_lock, conn:
+            known = {
+                row['url'] for row in conn.execute(
+                    f"SELECT url FROM movies WHERE url IN ({','.join('?' * len(rows))})",
+                    [row[0] for row in rows]
+                )
+            }
+            conn.executemany('''
+                INSERT INTO movies (url, title, poster, quality, year, rating, type, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    poster = excluded.poster,
+                    quality = excluded.quality,
+                    year = COALESCE(excluded.year, movies.year),
+                    rating = COALESCE(excluded.rating, movies.rating),
+                    type = excluded.type,
+                    updated_at = excluded.updated_at
+            ''', rows)
+        return len(rows) - len(known)
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Полнотекстовый поиск по названиям
+        :param query: Поисковый запрос
+        :return: Список фильмов, отсортированный по релевантности
+        """
+        # Каждое слово ищем как префикс, экранируя кавычки FTS5
+        terms = [term.replace('"', '""') for term in re.findall(r'\w+', query)]
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+
+        rows = self._connect().execute('''
+            SELECT movies.* FROM movies_fts
+            JOIN movies ON movies.id = movies_fts.rowid
+            WHERE movies_fts MATCH ?
+            ORDER BY bm25(movies_fts), movies.rating DESC
+            LIMIT ? OFFSET ?
+        ''', (match, limit, offset)).fetchall()
+        return [self._row_to_movie(row) for row in rows]
+
+    def list_movies(self, movie_type=None, year_from=None, year_to=None, min_rating=None,
+                    sort='rating', order='desc', limit=20, offset=0):
+        """
+        Список фильмов с фильтрацией и сортировкой
+        :param movie_type: Раздел каталога ('films', 'series', ...)
+        :param sort: Поле сортировки из SORT_FIELDS
+        :param order: 'asc' или 'desc'
+        :return: Список фильмов
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'Неизвестное поле сортировки: {sort}')
+
+        conditions = []
+        params = []
+        if movie_type:
+            conditions.append('type = ?')
+            params.append(movie_type)
+        if year_from is not None:
+            conditions.append('year >= ?')
+            params.append(year_from)
+        if year_to is not None:
+            conditions.append('year <= ?')
+            params.append(year_to)
+        if min_rating is not None:
+            conditions.append('rating >= ?')
+            params.append(min_rating)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        # Пустые значения всегда в конце списка
+        order_by = f"{SORT_FIELDS[sort]} IS NULL, {SORT_FIELDS[sort]} {direction}"
+
+        rows = self._connect().execute(
+            f'SELECT * FROM movies {where} ORDER BY {order_by} LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        ).fetchall()
+        return [self._row_to_movie(row) for row in rows]
+
+    def get_checkpoint(self, section):
+        """Возвращает (следующая страница, число завершенных проходов) для раздела"""
+        row = self._connect().execute(
+            'SELECT next_page, passes FROM crawl_state WHERE section = ?', (section,)
+        ).fetchone()
+        return (row['next_page'], row['passes']) if row else (1, 0)
+
+    def save_checkpoint(self, section, next_page, passes):
+        conn = self._connect()
+        with self._write_lock, conn:
+            conn.execute('''
+                INSERT INTO crawl_state (section, next_page, passes, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(section) DO UPDATE SET
+                    next_page = excluded.next_page,
+                    passes = excluded.passes,
+                    updated_at = excluded.updated_at
+            ''', (section, next_page, passes, time.time()))
+
+    def stats(self):
+        """Статистика каталога и состояние обхода"""
+        conn = self._connect()
+        by_type = {
+            row['type'] or 'unknown': row['count']
+            for row in conn.execute('SELECT type, COUNT(*) AS count FROM movies GROUP BY type')
+        }
+        crawl = {
+            row['section']: {
+                'next_page': row['next_page'],
+                'passes': row['passes'],
+                'updated_at': row['updated_at']
+            }
+            for row in conn.execute('SELECT * FROM crawl_state')
+        }
+        return {
+            'total': sum(by_type.values()),
+            'by_type': by_type,
+            'crawl': crawl
+        }
+
+class CatalogCrawler:
+    """
+    Фоновый инкрементальный обход разделов сайта.
+
+    Положение обхода сохраняется в crawl_state после каждой страницы, поэтому
+    после перезапуска обход продолжается с того же места. Первый проход идет
+    по всем страницам раздела; последующие останавливаются на первой странице
+    без новых карточек, так как разделы отсортированы по дате добавления.
+
+    Обходит только один процесс: start() берет эксклюзивную блокировку файла
+    <catalog>.lock, и остальные воркеры с CATALOG_CRAWLER=1 краулер не запускают.
+    """
+
+    def __init__(self, catalog, base_url=BASE_URL, sections=None, request_interval=2.0,
+                 idle_interval=1800, max_pages=None, lock_path=None):
+        self.catalog = catalog
+        self.base_url = base_url
+        self.sections = sections or SECTIONS
+        self.request_interval = request_interval
+        self.idle_interval = idle_interval
+        self.max_pages = max_pages
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_request = 0.0
+        self.lock_path = lock_path or f'{catalog.path}.lock'
+        self._lock_file = None
+
+    def _acquire_lock(self):
+        """Эксклюзивная блокировка краулера; держится до завершения процесса"""
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            logger.warning('File locks are unavailable, run the catalog crawler in one process only')
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def start(self):
+        """
+        Запускает обход в фоне
+        :return: False, если краулер уже работает в другом процессе
+        """
+        if self._thread and self._thread.is_alive():
+            return True
+        if not self._acquire_lock():
+            logger.info('Catalog crawler is running in another process')
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='catalog-crawler', daemon=True)
+        self._thread.start()
+        logger.info('Catalog crawler started')
+        return True
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _throttle(self):
+        """Выдерживает минимальный интервал между запросами к сайту"""
+        wait = self._last_request + self.request_interval - time.monotonic()
+        if wait > 0:
+            self._stop.wait(wait)
+        self._last_request = time.monotonic()
+
+    def crawl_page(self, section):
+        """
+        Обходит одну страницу раздела и сдвигает контрольную точку
+        :return: True, если проход по разделу завершен
+        """
+        page, passes = self.catalog.get_checkpoint(section)
+        self._throttle()
+        movies = get_listing_page(self.sections[section], page, base_url=self.base_url)
+        for movie in movies:
+            movie['type'] = section
+        added = self.catalog.upsert_movies(movies)
+        logger.info(f"Catalog crawl {section} page {page}: {len(movies)} cards, {added} new")
+
+        finished = (
+            not movies
+            or (self.max_pages and page >= self.max_pages)
+            or (passes > 0 and added == 0)
+        )
+        if finished:
+            self.catalog.save_checkpoint(section, 1, passes + 1)
+        else:
+            self.catalog.save_checkpoint(section, page + 1, passes)
+        return finished
+
+    def run_pass(self):
+        """Один полный цикл обхода по всем разделам"""
+        pending = list(self.sections)
+        errors = 0
+        while pending and not self._stop.is_set():
+            section = pending[0]
+            try:
+                if self.crawl_page(section):
+                    pending.pop(0)
+                errors = 0
+            except Exception as e:
+                errors += 1
+                # Экспоненциальная пауза при ошибках сайта
+                backoff = min(self.request_interval * 2 ** errors, 600)
+                logger.error(f"Catalog crawl error in {section}: {str(e)}, retry in {backoff}s")
+                self._stop.wait(backoff)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pass()
+            self._stop.wait(self.idle_interval)
@@ -0,0 +1,168 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+
+logger = logging.getLogger(__name__)
+
+class DetailsResolver:
+    """
+    Получение данных о фильмах с кэшированием и ограниченным параллелизмом.
+
+    Одновременные запросы одного URL объединяются в одну загрузку. Подсказки
+    выполняются в отдельном пуле из одного потока, чтобы не занимать пул
+    пакетных запросов; если подсказка еще в очереди, а URL уже запрошен
+    напрямую, она отменяется и загрузка идет в основном пуле.
+
+    Очередь основного пула ограничена max_queue загрузками: сверх нее новые URL
+    не принимаются (статус busy), чтобы незавершенные пакетные загрузки не
+    копились бесконечно и не задерживали одиночные запросы.
+    """
+
+    def __init__(self, cache, fetch, timeout=300, max_workers=4, prefetch_queue=20, max_queue=40,
+                 wait_timeout=30):
+        self.cache = cache
+        self.fetch = fetch
+        self.timeout = timeout
+        self.prefetch_queue = prefetch_queue
+        self.max_queue = max_queue
+        self.wait_timeout = wait_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='details')
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='details-prefetch')
+        self._in_flight = {}
+        self._prefetching = set()
+        self._prefetch_pending = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(url):
+        return f'details/{url}'
+
+    def get_cached(self, url):
+        return self.cache.get(self.cache_key(url))
+
+    def count_uncached(self, urls):
+        """Сколько URL придется загружать с сайта (для стоимости запроса в лимите)"""
+        return sum(1 for url in urls if self.get_cached(url) is None)
+
+    def _load(self, url):
+        try:
+            details = self.fetch(url)
+            # Неудачные загрузки не кэшируем, чтобы следующий запрос попробовал снова
+            if details:
+                self.cache.set(self.cache_key(url), details, timeout=self.timeout)
+            return details
+        finally:
+            with self._lock:
+                self._in_flight.pop(url, None)
+
+    def _submit(self, url):
+        """
+        Ставит загрузку URL в основной пул или присоединяется к уже идущей
+        :return: Future или None, если очередь пула заполнена
+        """
+        with self._lock:
+            future = self._in_flight.get(url)
+            if future is not None and url in self._prefetching and future.cancel():
+                # Подсказка еще ждет в очереди, а данные уже нужны: переносим загрузку в основной пул
+                self._prefetching.discard(url)
+                self._prefetch_pending -= 1
+                self._in_flight.pop(url)
+                future = None
+            if future is None:
+                if self._pending >= self.max_queue:
+                    return None
+                self._pending += 1
+                future = self._pool.submit(self._pool_load, url)
+                self._in_flight[url] = future
+            return future
+
+    def _pool_load(self, url):
+        try:
+            return self._load(url)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get(self, url):
+        """
+        Данные о фильме из кэша или с сайта (блокирующий вызов)
+        :return: Данные или None, если очередь заполнена или загрузка не уложилась в wait_timeout
+        """
+        details = self.get_cached(url)
+        if details is not None:
+            return details
+        future = self._submit(url)
+        if future is None:
+            logger.warning(f"Details queue is full, rejecting {url}")
+            return None
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except TimeoutError:
+            logger.warning(f"Timed out waiting for details of {url}")
+            return None
+
+    def get_many(self, urls, timeout=None, cached_only=False):
+        """
+        Пакетное получение данных о фильмах
+        :param urls: Список URL без повторов
+        :param timeout: Сколько ждать загрузки некэшированных URL
+        :param cached_only: Только читать кэш, не запуская загрузок (например, после подсказок)
+        :return: Словарь url -> (статус, данные); статусы: cached, ok, error, pending,
+            busy (очередь заполнена) и missing (нет в кэше при cached_only)
+        """
+        results = {}
+        futures = {}
+        for url in urls:
+            details = self.get_cached(url)
+            if details is not None:
+                results[url] = ('cached', details)
+            elif cached_only:
+                results[url] = ('pending', None) if url in self._in_flight else ('missing', None)
+            else:
+                future = self._submit(url)
+                if future is None:
+                    results[url] = ('busy', None)
+                else:
+                    futures[url] = future
+
+        if futures:
+            wait(futures.values(), timeout=timeout)
+
+        for url, future in futures.items():
+            if not future.done():
+                # Загрузка продолжается в фоне, результат попадет в кэш
+                results[url] = ('pending', None)
+                continue
+            try:
+                details = future.result()
+                results[url] = ('ok', details) if details else ('error', None)
+            except Exception as e:
+                logger.error(f"Error resolving details for {url}: {str(e)}")
+                results[url] = ('error', None)
+        return results
+
+    def prefetch(self, url):
+        """
+        Подсказка о скором запросе /movie/details или /movie/details/batch:
+        прогревает кэш details/{url} в фоне с низким приоритетом
+        :return: False, если URL уже в кэше, загружается или очередь заполнена
+        """
+        if self.get_cached(url) is not None:
+            return False
+        with self._lock:
+            if url in self._in_flight or self._prefetch_pending >= self.prefetch_queue:
+                return False
+            self._prefetch_pending += 1
+            self._prefetching.add(url)
+            self._in_flight[url] = self._prefetch_pool.submit(self._prefetch_load, url)
+        return True
+
+    def _prefetch_load(self, url):
+        with self._lock:
+            self._prefetching.discard(url)
+        try:
+            return self._load(url)
+        finally:
+            with self._lock:
+                self._prefetch_pending -= 1
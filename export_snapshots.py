@@ -0,0 +1,169 @@
+"""
+Экспорт статических снимков лент для раздачи через Nginx/CDN.
+
+Каждый запуск пишет новую версию в <output>/<version>/: JSON каждой ленты и
+результатов поиска по популярным запросам, рядом с ним сжатые .gz и .br
+(для gzip_static/brotli_static). После этого атомарно обновляется
+<output>/manifest.json, по которому фронтенд находит актуальные файлы.
+
+Запуск: python export_snapshots.py --output snapshots --interval 600 --query "матрица"
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+import logging
+from rezka_client import get_popular_movies, search_movies, RezkaClient
+
+try:
+    import brotli
+except ImportError:  # Без brotli пишутся только .gz
+    brotli = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def query_key(query):
+    """Нормализованный запрос; фронтенд использует то же правило для поиска в манифесте"""
+    return ' '.join(query.lower().split())
+
+def write_compressed(path, data):
+    """Пишет файл и его предварительно сжатые варианты"""
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(f'{path}.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9))
+    if brotli is not None:
+        with open(f'{path}.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+def collect_feeds(queries):
+    """
+    Загружает ленты и результаты поиска
+    :return: (ленты, поиск) только с успешно загруженными непустыми списками: ошибка
+        одной ленты или запроса не мешает обновить остальные, а пустой снимок скрыл
+        бы живые данные на max_age секунд
+    """
+    client = RezkaClient()
+    sources = {
+        'popular': get_popular_movies,
+        'now': lambda: client.get_movies('now'),
+        'new': lambda: client.get_movies('new')
+    }
+    data = {}
+    for name, load in sources.items():
+        try:
+            movies = load()
+        except Exception as e:
+            logger.error(f"Error loading feed {name}: {str(e)}")
+            continue
+        if movies:
+            data[name] = movies
+        else:
+            logger.warning(f"Skipping empty feed: {name}")
+
+    search = {}
+    for query in queries:
+        key = query_key(query)
+        try:
+            movies = search_movies(query)
+        except Exception as e:
+            logger.error(f"Error loading search results for {key}: {str(e)}")
+            continue
+        if movies:
+            search[key] = movies
+        else:
+            logger.warning(f"Skipping empty search results: {key}")
+    return data, search
+
+def export(output, queries=(), max_age=900, keep=3):
+    """
+    Экспортирует одну версию снимков
+    :param output: Каталог для снимков
+    :param queries: Популярные поисковые запросы
+    :param max_age: Сколько секунд фронтенд считает снимок актуальным
+    :param keep: Сколько последних версий хранить
+    :return: Манифест или None, если экспортировать нечего
+    """
+    feeds, search = collect_feeds(queries)
+    if not feeds and not search:
+        # Прежний манифест остается и устареет сам через max_age
+        logger.warning("Nothing to export, keeping the previous snapshot")
+        return None
+    payloads = {
+        name: json.dumps(movies, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        for name, movies in feeds.items()
+    }
+    search_payloads = {
+        query: json.dumps(movies, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        for query, movies in search.items()
+    }
+
+    digest = hashlib.sha256()
+    for payload in list(payloads.values()) + list(search_payloads.values()):
+        digest.update(payload)
+    version = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{digest.hexdigest()[:8]}"
+
+    version_dir = os.path.join(output, version)
+    os.makedirs(os.path.join(version_dir, 'search'), exist_ok=True)
+
+    manifest = {
+        'version': version,
+        'generated_at': int(time.time()),
+        'max_age': max_age,
+        'feeds': {},
+        'search': {}
+    }
+    for name, payload in payloads.items():
+        path = f'{version}/{name}.json'
+        write_compressed(os.path.join(output, path), payload)
+        manifest['feeds'][name] = path
+    for query, payload in search_payloads.items():
+        path = f"{version}/search/{hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]}.json"
+        write_compressed(os.path.join(output, path), payload)
+        manifest['search'][query] = path
+
+    # Манифест заменяется атомарно, чтобы клиенты не увидели его недописанным
+    manifest_path = os.path.join(output, 'manifest.json')
+    write_compressed(f'{manifest_path}.tmp', json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+    for suffix in ('', '.gz', '.br'):
+        if os.path.exists(f'{manifest_path}.tmp{suffix}'):
+            os.replace(f'{manifest_path}.tmp{suffix}', f'{manifest_path}{suffix}')
+
+    # Старые версии удаляются, но последние keep остаются для клиентов со старым манифестом
+    versions = [
+        entry.name for entry in sorted(
+            (entry for entry in os.scandir(output) if entry.is_dir() and entry.name != version),
+            key=lambda entry: entry.stat().st_mtime
+        )
+    ]
+    for old in versions[:max(len(versions) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(output, old), ignore_errors=True)
+
+    logger.info(f"Exported snapshot {version}: {len(payloads)} feeds, {len(search_payloads)} queries")
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='Экспорт статических снимков лент')
+    parser.add_argument('--output', default=os.environ.get('SNAPSHOT_DIR', 'snapshots'))
+    parser.add_argument('--query', action='append', default=[], help='Поисковый запрос для снимка')
+    parser.add_argument('--interval', type=int, default=0, help='Период экспорта в секундах (0 - один раз)')
+    parser.add_argument('--max-age', type=int, default=900)
+    parser.add_argument('--keep', type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    while True:
+        try:
+            export(args.output, args.query, max_age=args.max_age, keep=args.keep)
+        except Exception as e:
+            logger.error(f"Error exporting snapshots: {str(e)}")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
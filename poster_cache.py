@@ -0,0 +1,233 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+import logging
+from urllib.parse import urljoin, urlparse
+import requests
+
+try:
+    from PIL import Image
+except ImportError:  # Без Pillow постеры отдаются в исходном размере
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Допустимые ширины миниатюр: сетка карточек 200px, плюс варианты для маленьких и HiDPI экранов
+THUMBNAIL_WIDTHS = (150, 300, 600)
+MAX_POSTER_SIZE = 5 * 1024 * 1024
+MAX_REDIRECTS = 3
+# Растровые форматы, которые умеет читать Pillow; SVG и прочее не проксируем
+POSTER_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+class PosterCache:
+    """
+    Дисковый кэш постеров.
+
+    Исходные файлы хранятся под именем sha256 содержимого, поэтому одинаковые
+    постеры с разных зеркал занимают место один раз, а хэш служит строгим
+    ETag. Соответствие URL -> хэш хранится в каталоге index. Когда размер кэша
+    превышает max_bytes, удаляются файлы и записи индекса с самым давним обращением.
+
+    Каталог может быть общим для нескольких воркеров: размер кэша заново
+    считается по диску не реже раза в scan_interval секунд, а между проверками
+    к нему прибавляются записи текущего процесса.
+    """
+
+    def __init__(self, directory='poster_cache', max_bytes=512 * 1024 * 1024, allowed_hosts=(), scan_interval=30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.allowed_hosts = tuple(allowed_hosts)
+        self._index_dir = os.path.join(directory, 'index')
+        self._files_dir = os.path.join(directory, 'files')
+        os.makedirs(self._index_dir, exist_ok=True)
+        os.makedirs(self._files_dir, exist_ok=True)
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._size_lock = threading.Lock()
+        self.scan_interval = scan_interval
+        self._total_bytes = 0
+        self._last_scan = 0
+
+    def _is_allowed(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.allowed_hosts)
+
+    def _write(self, path, data):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._size_lock:
+            self._total_bytes += len(data)
+
+    def _touch(self, path):
+        # Время изменения используется как время последнего обращения для вытеснения
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _fetch(self, url, url_key):
+        """Загружает исходный постер и возвращает имя файла в кэше"""
+        # Редиректы проходим вручную, чтобы зеркало не увело прокси на чужой хост
+        for _ in range(MAX_REDIRECTS + 1):
+            response = requests.get(url, headers=HEADERS, timeout=10, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                break
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+            if not self._is_allowed(url):
+                raise ValueError('Недопустимый адрес постера после редиректа')
+        else:
+            raise ValueError('Слишком много редиректов')
+
+        with response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+            if content_type not in POSTER_TYPES:
+                raise ValueError(f'Неподдерживаемый формат постера: {content_type}')
+
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > MAX_POSTER_SIZE:
+                    raise ValueError('Постер слишком большой')
+            data = b''.join(chunks)
+
+        ext = mimetypes.guess_extension(content_type) or '.img'
+        name = hashlib.sha256(data).hexdigest() + ext
+        path = os.path.join(self._files_dir, name)
+        if not os.path.exists(path):
+            self._write(path, data)
+        with open(os.path.join(self._index_dir, url_key), 'w') as f:
+            f.write(name)
+        return name
+
+    @staticmethod
+    def _thumbnail_name(name, width):
+        if Image is None or width is None:
+            return None
+        return f'{os.path.splitext(name)[0]}_w{width}.jpg'
+
+    def _thumbnail(self, name, width):
+        """Создает миниатюру заданной ширины; без Pillow возвращает исходный файл"""
+        thumb_name = self._thumbnail_name(name, width)
+        if thumb_name is None:
+            return name
+        thumb_path = os.path.join(self._files_dir, thumb_name)
+        if self._touch(thumb_path):
+            return thumb_name
+
+        tmp_path = f'{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with Image.open(os.path.join(self._files_dir, name)) as image:
+                if image.width <= width:
+                    return name
+                image.thumbnail((width, width * 3))
+                image.convert('RGB').save(tmp_path, 'JPEG', quality=82, optimize=True, progressive=True)
+        except (OSError, Image.DecompressionBombError) as e:
+            # Битый или нечитаемый файл отдаем как есть
+            logger.error(f"Error creating poster thumbnail for {name}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return name
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, thumb_path)
+        with self._size_lock:
+            self._total_bytes += size
+        return thumb_name
+
+    def _read_index(self, index_path):
+        try:
+            with open(index_path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def has(self, url, width=None):
+        """Есть ли постер на диске, то есть запрос не потребует загрузки с сайта"""
+        url_key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        name = self._read_index(os.path.join(self._index_dir, url_key))
+        if not name:
+            return False
+        if width is not None and width not in THUMBNAIL_WIDTHS:
+            width = min(THUMBNAIL_WIDTHS, key=lambda allowed: abs(allowed - width))
+        thumb_name = self._thumbnail_name(name, width)
+        return any(
+            os.path.exists(os.path.join(self._files_dir, candidate))
+            for candidate in (thumb_name, name) if candidate
+        )
+
+    def get(self, url, width=None):
+        """
+        Возвращает постер из кэша, при необходимости загружая его
+        :param url: URL постера на зеркале
+        :param width: Ширина миниатюры из THUMBNAIL_WIDTHS или None для оригинала
+        :return: (путь к файлу, ETag, MIME-тип)
+        """
+        if not self._is_allowed(url):
+            raise ValueError('Недопустимый адрес постера')
+        if width is not None and width not in THUMBNAIL_WIDTHS:
+            width = min(THUMBNAIL_WIDTHS, key=lambda allowed: abs(allowed - width))
+
+        url_key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        index_path = os.path.join(self._index_dir, url_key)
+        with self._locks[int(url_key[:8], 16) % len(self._locks)]:
+            name = self._read_index(index_path)
+            if name:
+                # Записи индекса тоже вытесняются по времени последнего обращения
+                self._touch(index_path)
+            thumb_name = self._thumbnail_name(name, width) if name else None
+            if thumb_name and self._touch(os.path.join(self._files_dir, thumb_name)):
+                # Готовая миниатюра не требует исходного файла
+                name = thumb_name
+            else:
+                if not name or not self._touch(os.path.join(self._files_dir, name)):
+                    name = self._fetch(url, url_key)
+                name = self._thumbnail(name, width)
+
+        path = os.path.join(self._files_dir, name)
+        self._evict(keep=path)
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        return path, os.path.splitext(name)[0], mimetype
+
+    def _evict(self, keep=None):
+        """Удаляет самые старые по обращению файлы (кроме keep), пока кэш не станет меньше 90% лимита"""
+        with self._size_lock:
+            now = time.monotonic()
+            if self._total_bytes <= self.max_bytes and now - self._last_scan < self.scan_interval:
+                return
+            # Другие воркеры тоже пишут в каталог, поэтому размер берем с диска.
+            # Индекс учитывается вместе с файлами: иначе разные URL одного постера растят его без предела
+            entries = [
+                entry
+                for directory in (self._files_dir, self._index_dir)
+                for entry in os.scandir(directory)
+                if entry.is_file() and not entry.name.endswith('.tmp')
+            ]
+            self._total_bytes = sum(entry.stat().st_size for entry in entries)
+            self._last_scan = now
+            if self._total_bytes <= self.max_bytes:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            target = self.max_bytes * 0.9
+            for entry in entries:
+                if self._total_bytes <= target:
+                    break
+                if entry.path == keep:
+                    continue
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self._total_bytes -= size
+                except FileNotFoundError:
+                    continue
+            logger.info(f"Poster cache evicted to {self._total_bytes} bytes")
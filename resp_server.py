@@ -0,0 +1,478 @@
+"""
+Минимальный сервер с протоколом Redis (RESP2) для локальной разработки и тестов.
+
+Поддерживает команды, которые используют общий кэш (shared_cache.py) и
+хранилище Flask-Limiter: строки с TTL, INCRBY, MULTI/EXEC, KEYS, PUBLISH и
+SUBSCRIBE. Lua не исполняется: EVAL/EVALSHA распознают только скрипты
+библиотеки limits (incr_expire и clear_keys) и выполняют их эквивалент на Python.
+Сообщения pub/sub пишутся подписчику из его собственного потока через очередь,
+поэтому медленный или отключившийся подписчик не задерживает остальных клиентов.
+Данные хранятся в памяти процесса; для продакшена нужен настоящий Redis.
+
+Запуск: python resp_server.py --port 6379
+"""
+import argparse
+import fnmatch
+import hashlib
+import queue
+import socket
+import socketserver
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CommandError(Exception):
+    pass
+
+class Store:
+    """Хранилище ключей с TTL и подписками, общее для всех соединений"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.scripts = {}
+        self.subscribers = {}
+        self.lock = threading.RLock()
+        self._writes = 0
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _sweep(self):
+        # Периодически удаляем истекшие ключи, к которым больше не обращаются
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            for key in list(self.expires):
+                self._alive(key)
+
+    def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def set(self, key, value, ttl=None):
+        self._sweep()
+        self.data[key] = value
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.time() + ttl
+
+    def delete(self, key):
+        existed = self._alive(key)
+        self.data.pop(key, None)
+        self.expires.pop(key, None)
+        return int(existed)
+
+    def incrby(self, key, amount):
+        value = self.get(key)
+        try:
+            value = int(value or 0) + amount
+        except ValueError:
+            raise CommandError('ERR value is not an integer or out of range')
+        # Время жизни ключа при инкременте сохраняется
+        self._sweep()
+        self.data[key] = str(value).encode()
+        return value
+
+    def expire(self, key, ttl):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.time() + ttl
+        return 1
+
+    def pttl(self, key):
+        if not self._alive(key):
+            return -2
+        expires = self.expires.get(key)
+        return -1 if expires is None else max(int((expires - time.time()) * 1000), 0)
+
+    def keys(self, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def publish(self, channel, message):
+        # Сообщения только ставятся в очередь подписчика; в сокет их пишет его собственный поток
+        return sum(handler.deliver([b'message', channel, message]) for handler in list(self.subscribers.get(channel, ())))
+
+    def unsubscribe_all(self, handler):
+        for channel in handler.channels:
+            self.subscribers.get(channel, set()).discard(handler)
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError('ERR value is not an integer or out of range')
+
+def run_script(store, script, keys, args):
+    """Python-эквиваленты Lua-скриптов библиотеки limits"""
+    if b'incrby' in script and b'expire' in script:
+        amount = _int(args[1])
+        current = store.incrby(keys[0], amount)
+        if current == amount:
+            store.expire(keys[0], _int(args[0]))
+        return current
+    if b"redis.call('keys'" in script and b"'del'" in script:
+        return sum(store.delete(key) for key in store.keys(keys[0]))
+    raise CommandError('ERR Lua scripts are not supported by this server')
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """Одно клиентское соединение"""
+
+    # Сколько сообщений может ждать медленный подписчик, прежде чем его отключат
+    OUTBOX_SIZE = 10000
+
+    def setup(self):
+        super().setup()
+        self.store = self.server.store
+        self.transaction = None
+        self.channels = set()
+        self.write_lock = threading.Lock()
+        self.outbox = None
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # Инлайн-команда (например, из telnet)
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def encode(self, value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, bool):
+            return b':%d\r\n' % value
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, CommandError):
+            return b'-%s\r\n' % str(value).encode()
+        if isinstance(value, Status):
+            return b'+%s\r\n' % value.text.encode()
+        if isinstance(value, (list, tuple)):
+            return b'*%d\r\n' % len(value) + b''.join(self.encode(item) for item in value)
+        if isinstance(value, str):
+            value = value.encode()
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def push(self, value):
+        with self.write_lock:
+            self.wfile.write(self.encode(value))
+            self.wfile.flush()
+
+    def send(self, value):
+        """Ответ клиенту; в режиме подписки - через очередь, чтобы не нарушить порядок с сообщениями"""
+        if self.outbox is None:
+            self.push(value)
+        else:
+            self.deliver(value)
+
+    def deliver(self, value):
+        """Ставит сообщение в очередь подписчика; вызывается под store.lock и не пишет в сокет"""
+        try:
+            self.outbox.put_nowait(value)
+            return 1
+        except queue.Full:
+            logger.warning("Disconnecting slow subscriber")
+            self.store.unsubscribe_all(self)
+            self.channels.clear()
+            self.disconnect()
+            return 0
+
+    def disconnect(self):
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _write_outbox(self):
+        while True:
+            value = self.outbox.get()
+            if value is None:
+                return
+            try:
+                self.push(value)
+            except (OSError, ValueError):
+                # Подписчик отключился (или соединение уже закрыто): отписываем его, ошибка не касается других клиентов
+                with self.store.lock:
+                    self.store.unsubscribe_all(self)
+                    self.channels.clear()
+                self.disconnect()
+                return
+
+    def handle(self):
+        try:
+            while True:
+                args = self.read_command()
+                if args is None:
+                    break
+                if not args:
+                    continue
+                try:
+                    result = self.dispatch(args)
+                except CommandError as e:
+                    result = e
+                if result is not NO_REPLY:
+                    self.send(result)
+                if args[0].upper() == b'QUIT':
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.store.lock:
+                self.store.unsubscribe_all(self)
+            if self.outbox is not None:
+                self.outbox.put(None)
+
+    def dispatch(self, args):
+        name = args[0].upper().decode()
+        if self.transaction is not None and name not in ('EXEC', 'DISCARD', 'MULTI'):
+            self.transaction.append(args)
+            return Status('QUEUED')
+        handler = getattr(self, f'cmd_{name.lower()}', None)
+        if handler is None:
+            raise CommandError(f"ERR unknown command '{name}'")
+        with self.store.lock:
+            return handler(*args[1:])
+
+    # Служебные команды
+    def cmd_ping(self, message=None):
+        if self.channels:
+            return [b'pong', message or b'']
+        return Status('PONG') if message is None else message
+
+    def cmd_hello(self, *args):
+        # Поддерживается только RESP2: клиент должен подключаться с protocol=2
+        raise CommandError('NOPROTO unsupported protocol version')
+
+    def cmd_echo(self, message):
+        return message
+
+    def cmd_select(self, db):
+        return OK
+
+    def cmd_client(self, *args):
+        return OK
+
+    def cmd_quit(self):
+        return OK
+
+    def cmd_dbsize(self):
+        return len(self.store.keys(b'*'))
+
+    def cmd_flushdb(self, *args):
+        self.store.data.clear()
+        self.store.expires.clear()
+        return OK
+
+    cmd_flushall = cmd_flushdb
+
+    # Строки и время жизни
+    def cmd_get(self, key):
+        return self.store.get(key)
+
+    def cmd_mget(self, *keys):
+        return [self.store.get(key) for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        ttl = None
+        nx = xx = False
+        options = [option.upper() for option in options]
+        i = 0
+        while i < len(options):
+            if options[i] == b'EX':
+                ttl = _int(options[i + 1])
+                i += 1
+            elif options[i] == b'PX':
+                ttl = _int(options[i + 1]) / 1000
+                i += 1
+            elif options[i] == b'NX':
+                nx = True
+            elif options[i] == b'XX':
+                xx = True
+            else:
+                raise CommandError('ERR syntax error')
+            i += 1
+        exists = self.store._alive(key)
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.store.set(key, value, ttl)
+        return OK
+
+    def cmd_setex(self, key, seconds, value):
+        self.store.set(key, value, _int(seconds))
+        return OK
+
+    def cmd_psetex(self, key, milliseconds, value):
+        self.store.set(key, value, _int(milliseconds) / 1000)
+        return OK
+
+    def cmd_setnx(self, key, value):
+        if self.store._alive(key):
+            return 0
+        self.store.set(key, value)
+        return 1
+
+    def cmd_mset(self, *pairs):
+        for key, value in zip(pairs[::2], pairs[1::2]):
+            self.store.set(key, value)
+        return OK
+
+    def cmd_del(self, *keys):
+        return sum(self.store.delete(key) for key in keys)
+
+    cmd_unlink = cmd_del
+
+    def cmd_exists(self, *keys):
+        return sum(int(self.store._alive(key)) for key in keys)
+
+    def cmd_incr(self, key):
+        return self.store.incrby(key, 1)
+
+    def cmd_incrby(self, key, amount):
+        return self.store.incrby(key, _int(amount))
+
+    def cmd_decr(self, key):
+        return self.store.incrby(key, -1)
+
+    def cmd_decrby(self, key, amount):
+        return self.store.incrby(key, -_int(amount))
+
+    def cmd_expire(self, key, seconds):
+        return self.store.expire(key, _int(seconds))
+
+    def cmd_pexpire(self, key, milliseconds):
+        return self.store.expire(key, _int(milliseconds) / 1000)
+
+    def cmd_persist(self, key):
+        return int(self.store._alive(key) and self.store.expires.pop(key, None) is not None)
+
+    def cmd_pttl(self, key):
+        return self.store.pttl(key)
+
+    def cmd_ttl(self, key):
+        ttl = self.store.pttl(key)
+        return ttl if ttl < 0 else (ttl + 999) // 1000
+
+    def cmd_keys(self, pattern):
+        return self.store.keys(pattern)
+
+    # Транзакции (redis-py pipeline)
+    def cmd_multi(self):
+        if self.transaction is not None:
+            raise CommandError('ERR MULTI calls can not be nested')
+        self.transaction = []
+        return OK
+
+    def cmd_exec(self):
+        if self.transaction is None:
+            raise CommandError('ERR EXEC without MULTI')
+        queued, self.transaction = self.transaction, None
+        results = []
+        for args in queued:
+            try:
+                results.append(self.dispatch(args))
+            except CommandError as e:
+                results.append(e)
+        return results
+
+    def cmd_discard(self):
+        self.transaction = None
+        return OK
+
+    # Скрипты
+    def cmd_script(self, subcommand, *args):
+        subcommand = subcommand.upper()
+        if subcommand == b'LOAD':
+            sha = hashlib.sha1(args[0]).hexdigest().encode()
+            self.store.scripts[sha] = args[0]
+            return sha
+        if subcommand == b'EXISTS':
+            return [int(sha.lower() in self.store.scripts) for sha in args]
+        if subcommand == b'FLUSH':
+            self.store.scripts.clear()
+            return OK
+        raise CommandError('ERR unknown SCRIPT subcommand')
+
+    def cmd_eval(self, script, numkeys, *args):
+        self.store.scripts[hashlib.sha1(script).hexdigest().encode()] = script
+        numkeys = _int(numkeys)
+        return run_script(self.store, script, args[:numkeys], args[numkeys:])
+
+    def cmd_evalsha(self, sha, numkeys, *args):
+        script = self.store.scripts.get(sha.lower())
+        if script is None:
+            raise CommandError('NOSCRIPT No matching script. Please use EVAL.')
+        numkeys = _int(numkeys)
+        return run_script(self.store, script, args[:numkeys], args[numkeys:])
+
+    # Pub/Sub
+    def cmd_publish(self, channel, message):
+        return self.store.publish(channel, message)
+
+    def cmd_subscribe(self, *channels):
+        if self.outbox is None:
+            self.outbox = queue.Queue(self.OUTBOX_SIZE)
+            thread = threading.Thread(target=self._write_outbox, name='resp-subscriber', daemon=True)
+            thread.start()
+        for channel in channels:
+            self.channels.add(channel)
+            self.store.subscribers.setdefault(channel, set()).add(self)
+            self.deliver([b'subscribe', channel, len(self.channels)])
+        return NO_REPLY
+
+    def cmd_unsubscribe(self, *channels):
+        for channel in channels or list(self.channels):
+            self.channels.discard(channel)
+            self.store.subscribers.get(channel, set()).discard(self)
+            self.send([b'unsubscribe', channel, len(self.channels)])
+        return NO_REPLY
+
+class Status:
+    def __init__(self, text):
+        self.text = text
+
+OK = Status('OK')
+NO_REPLY = object()
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.store = Store()
+
+def start_background(host='127.0.0.1', port=0):
+    """Запускает сервер в фоновом потоке; возвращает (сервер, порт)"""
+    server = RespServer((host, port))
+    thread = threading.Thread(target=server.serve_forever, name='resp-server', daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный сервер с протоколом Redis')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    server = RespServer((args.host, args.port))
+    logger.info(f"Listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
+import codecs
 import requests
 from bs4 import BeautifulSoup
 from hdrezka_api import HdRezkaApi
 import re
+from urllib.parse import quote
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,7 +13,175 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Постеры отдаются через прокси приложения (см. маршрут /poster) в размере сетки карточек
+POSTER_PROXY_PATH = '/poster'
+POSTER_WIDTH = 300
+
+def proxy_poster_url(url):
+    """Переписывает ссылку на постер зеркала на прокси приложения"""
+    if not url:
+        return url
+    if url.startswith('//'):
+        url = 'https:' + url
+    return f"{POSTER_PROXY_PATH}?url={quote(url, safe='')}&w={POSTER_WIDTH}"
+
+def parse_movie_card(movie, base_url):
+    """
+    Разбирает одну карточку фильма из списка
+    :param movie: Элемент div.b-content__inline_item
+    :param base_url: Базовый URL зеркала для относительных ссылок
+    :return: Словарь с данными фильма или None
+    """
+    link = movie.find('a')
+    if not link:
+        return None
+
+    movie_url = link.get('href', '')
+    # Добавляем базовый URL если его нет
+    if movie_url and not movie_url.startswith(('http://', 'https://')):
+        movie_url = base_url + movie_url
+
+    title = link.get('title', '').strip()
+    if not title:
+        title_elem = movie.find('div', class_='b-content__inline_item-link')
+        title_link = title_elem.find('a') if title_elem else None
+        title = title_link.text.strip() if title_link else ''
+
+    # Получаем постер
+    poster = movie.find('img')
+    poster_url = poster.get('src', '') if poster else ''
+    if poster_url and not poster_url.startswith('http'):
+        poster_url = 'https:' + poster_url
+
+    # Получаем качество
+    quality = None
+    quality_elem = movie.find('div', class_='quality')
+    if quality_elem:
+        quality = quality_elem.text.strip()
+
+    # Получаем год
+    year = None
+    info_elem = movie.find('div', class_='b-content__inline_item-link')
+    year_elem = info_elem.find('div') if info_elem else None
+    if year_elem:
+        year_match = re.search(r'\d{4}', year_elem.text)
+        if year_match:
+            year = year_match.group()
+
+    # Получаем рейтинг
+    rating = None
+    rating_elem = movie.find('span', class_='rating')
+    if rating_elem:
+        rating = rating_elem.text.strip()
+
+    return {
+        'url': movie_url,
+        'title': title,
+        'poster': proxy_poster_url(poster_url),
+        'quality': quality,
+        'year': year,
+        'rating': rating
+    }
+
+def parse_movie_cards(html, base_url, limit=None):
+    """
+    Разбирает все карточки фильмов на странице списка
+    :param html: HTML страницы
+    :param base_url: Базовый URL зеркала
+    :param limit: Максимальное количество карточек
+    :return: Список фильмов
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    movies_list = []
+
+    # Находим все карточки фильмов
+    for movie in soup.find_all('div', class_='b-content__inline_item'):
+        if limit is not None and len(movies_list) >= limit:
+            break
+        card = parse_movie_card(movie, base_url)
+        if card:
+            movies_list.append(card)
+
+    return movies_list
+
+# Начало разметки карточки: по нему страница режется на карточки во время загрузки
+CARD_MARKER = '<div class="b-content__inline_item"'
+
+def iter_card_chunks(url, timeout=10):
+    """
+    Загружает страницу потоком и отдает HTML каждой карточки, как только она получена целиком
+    :param url: URL страницы списка
+    :return: Генератор фрагментов HTML
+    """
+    with requests.get(url, headers=HEADERS, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        # requests подставляет ISO-8859-1 для text/html без charset; сайт отдает UTF-8
+        content_type = response.headers.get('Content-Type', '').lower()
+        encoding = response.encoding if 'charset=' in content_type else 'utf-8'
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        buffer = ''
+        for chunk in response.iter_content(chunk_size=8192):
+            buffer += decoder.decode(chunk)
+            start = buffer.find(CARD_MARKER)
+            if start == -1:
+                # Оставляем хвост: в нем может быть начало разрезанного маркера
+                buffer = buffer[-len(CARD_MARKER):]
+                continue
+            buffer = buffer[start:]
+            # Карточка завершена, когда пришло начало следующей
+            end = buffer.find(CARD_MARKER, 1)
+            while end != -1:
+                yield buffer[:end]
+                buffer = buffer[end:]
+                end = buffer.find(CARD_MARKER, 1)
+        buffer += decoder.decode(b'', final=True)
+        if buffer.startswith(CARD_MARKER):
+            yield buffer
+
+def iter_movie_cards(url, base_url, limit=None, parse=parse_movie_card):
+    """
+    Потоковый разбор страницы списка
+    :param url: URL страницы списка
+    :param base_url: Базовый URL зеркала
+    :param limit: Максимальное количество карточек
+    :param parse: Функция разбора одной карточки
+    :return: Генератор карточек
+    """
+    count = 0
+    for chunk in iter_card_chunks(url):
+        movie = BeautifulSoup(chunk, 'html.parser').find('div', class_='b-content__inline_item')
+        card = parse(movie, base_url) if movie else None
+        if not card:
+            continue
+        yield card
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+def get_listing_page(path, page=1, base_url=BASE_URL, timeout=10):
+    """
+    Загружает и разбирает страницу раздела каталога
+    :param path: Путь раздела, например '/films/'
+    :param page: Номер страницы
+    :return: Список фильмов на странице
+    """
+    url = base_url + path
+    if page > 1:
+        url = f"{url.rstrip('/')}/page/{page}/"
+    response = requests.get(url, headers=HEADERS, timeout=timeout)
+    # Страница за пределами раздела — конец списка
+    if response.status_code == 404:
+        return []
+    response.raise_for_status()
+    return parse_movie_cards(response.text, base_url)
+
 class RezkaClient:
+    # URLs для разных категорий
+    CATEGORY_URLS = {
+        'now': '/film/',  # Сейчас смотрят (главная страница с фильмами)
+        'new': '/film/2024/'  # Новинки (фильмы 2024 года)
+    }
+
     def __init__(self):
         self.base_url = 'https://hdrezka.ag'
         self.headers = {
@@ -28,73 +198,14 @@ class RezkaClient:
             if category == 'popular':
                 return get_popular_movies()
             
-            # URLs для разных категорий
-            category_urls = {
-                'now': '/film/',  # Сейчас смотрят (главная страница с фильмами)
-                'new': '/film/2024/'  # Новинки (фильмы 2024 года)
-            }
-            
-            if category not in category_urls:
+            if category not in self.CATEGORY_URLS:
                 raise ValueError(f'Неизвестная категория: {category}')
             
-            url = self.base_url + category_urls[category]
+            url = self.base_url + self.CATEGORY_URLS[category]
             response = requests.get(url, headers=self.headers)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            movies_list = []
-            
-            # Находим все карточки фильмов
-            movies = soup.find_all('div', class_='b-content__inline_item')
-            
-            for movie in movies[:20]:  # Ограничиваем до 20 фильмов
-                link = movie.find('a')
-                if not link:
-                    continue
-                    
-                movie_url = link.get('href', '')
-                # Добавляем базовый URL если его нет
-                if movie_url and not movie_url.startswith(('http://', 'https://')):
-                    movie_url = self.base_url + movie_url
-                
-                title = link.get('title', '').strip()
-                
-                # Получаем постер
-                poster = movie.find('img')
-                poster_url = poster.get('src', '') if poster else ''
-                if poster_url and not poster_url.startswith('http'):
-                    poster_url = 'https:' + poster_url
-                
-                # Получаем качество
-                quality = None
-                quality_elem = movie.find('div', class_='quality')
-                if quality_elem:
-                    quality = quality_elem.text.strip()
-                
-                # Получаем год
-                year = None
-                year_elem = movie.find('div', class_='b-content__inline_item-link').find('div')
-                if year_elem:
-                    year_match = re.search(r'\d{4}', year_elem.text)
-                    if year_match:
-                        year = year_match.group()
-                
-                # Получаем рейтинг
-                rating = None
-                rating_elem = movie.find('span', class_='rating')
-                if rating_elem:
-                    rating = rating_elem.text.strip()
-                
-                movies_list.append({
-                    'url': movie_url,
-                    'title': title,
-                    'poster': poster_url,
-                    'quality': quality,
-                    'year': year,
-                    'rating': rating
-                })
-            
-            return movies_list
+            return parse_movie_cards(response.text, self.base_url, limit=20)  # Ограничиваем до 20 фильмов
             
         except requests.RequestException as e:
             logger.error(f"Error fetching movies: {str(e)}")
@@ -103,37 +214,67 @@ class RezkaClient:
             logger.error(f"Unexpected error: {str(e)}")
             raise Exception(f"Неожиданная ошибка: {str(e)}")
 
+    def stream_movies(self, category):
+        """
+        Потоковый вариант get_movies: карточки отдаются по мере загрузки страницы
+        :param category: Категория фильмов ('now', 'new', 'popular')
+        :return: Генератор фильмов
+        """
+        if category == 'popular':
+            return iter_movie_cards(f"{BASE_URL}/films/", BASE_URL, limit=20)
+        if category not in self.CATEGORY_URLS:
+            raise ValueError(f'Неизвестная категория: {category}')
+        return iter_movie_cards(self.base_url + self.CATEGORY_URLS[category], self.base_url, limit=20)
+
+def parse_search_card(item, base_url=None):
+    """
+    Разбирает карточку из результатов поиска
+    :param item: Элемент div.b-content__inline_item
+    :return: Словарь с данными фильма или None
+    """
+    link = item.find('a')
+    image = item.find('img')
+    info = item.find('div', class_='b-content__inline_item-link')
+
+    if not (link and image and info):
+        return None
+
+    title = info.find('a').text.strip()
+    year = info.find('div').text.strip()
+    rating_elem = item.find('i', class_='b-rating_icon')
+    rating = rating_elem.text.strip() if rating_elem else "0.0"
+
+    return {
+        'title': title,
+        'year': year,
+        'rating': rating,
+        'poster': proxy_poster_url(image.get('src', '')),
+        'url': link['href'] if 'href' in link.attrs else ''
+    }
+
+def get_search_url(query):
+    return f"{BASE_URL}/search/?do=search&subaction=search&q={query}"
+
 def search_movies(query):
-    search_url = f"{BASE_URL}/search/?do=search&subaction=search&q={query}"
     try:
-        response = requests.get(search_url, headers=HEADERS)
+        response = requests.get(get_search_url(query), headers=HEADERS)
         soup = BeautifulSoup(response.content, 'html.parser')
         results = []
         
         for item in soup.find_all('div', class_='b-content__inline_item'):
-            link = item.find('a')
-            image = item.find('img')
-            info = item.find('div', class_='b-content__inline_item-link')
-            
-            if link and image and info:
-                title = info.find('a').text.strip()
-                year = info.find('div').text.strip()
-                rating_elem = item.find('i', class_='b-rating_icon')
-                rating = rating_elem.text.strip() if rating_elem else "0.0"
-                
-                results.append({
-                    'title': title,
-                    'year': year,
-                    'rating': rating,
-                    'poster': image['src'] if 'src' in image.attrs else '',
-                    'url': link['href'] if 'href' in link.attrs else ''
-                })
+            card = parse_search_card(item)
+            if card:
+                results.append(card)
         
         return results
     except Exception as e:
         logger.error(f"Error searching movies: {e}")
         return []
 
+def iter_search_movies(query):
+    """Потоковый вариант search_movies: отдает карточки по мере загрузки страницы"""
+    return iter_movie_cards(get_search_url(query), BASE_URL, parse=parse_search_card)
+
 def get_movie_details(url):
     try:
         # Добавляем базовый URL, если его нет
@@ -207,60 +348,7 @@ def get_popular_movies():
         response = requests.get(url, headers=HEADERS)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        movies_list = []
-        
-        # Находим все карточки фильмов
-        movies = soup.find_all('div', class_='b-content__inline_item')
-        
-        for movie in movies[:20]:  # Ограничиваем до 20 фильмов
-            link = movie.find('a')
-            if not link:
-                continue
-                
-            movie_url = link.get('href', '')
-            # Добавляем базовый URL если его нет
-            if movie_url and not movie_url.startswith(('http://', 'https://')):
-                movie_url = BASE_URL + movie_url
-            
-            title = link.get('title', '').strip()
-            
-            # Получаем постер
-            poster = movie.find('img')
-            poster_url = poster.get('src', '') if poster else ''
-            if poster_url and not poster_url.startswith('http'):
-                poster_url = 'https:' + poster_url
-            
-            # Получаем качество
-            quality = None
-            quality_elem = movie.find('div', class_='quality')
-            if quality_elem:
-                quality = quality_elem.text.strip()
-            
-            # Получаем год
-            year = None
-            year_elem = movie.find('div', class_='b-content__inline_item-link').find('div')
-            if year_elem:
-                year_match = re.search(r'\d{4}', year_elem.text)
-                if year_match:
-                    year = year_match.group()
-            
-            # Получаем рейтинг
-            rating = None
-            rating_elem = movie.find('span', class_='rating')
-            if rating_elem:
-                rating = rating_elem.text.strip()
-            
-            movies_list.append({
-                'url': movie_url,
-                'title': title,
-                'poster': poster_url,
-                'quality': quality,
-                'year': year,
-                'rating': rating
-            })
-        
-        return movies_list
+        return parse_movie_cards(response.text, BASE_URL, limit=20)  # Ограничиваем до 20 фильмов
         
     except requests.RequestException as e:
         logger.error(f"Error fetching popular movies: {str(e)}")
@@ -0,0 +1,170 @@
+import threading
+import time
+import uuid
+import logging
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.simplecache import SimpleCache
+from flask_caching.backends.rediscache import RedisCache
+
+try:
+    import redis
+except ImportError:  # Нужен только при CACHE_TYPE = 'shared_cache.TwoTierCache'
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class TwoTierCache(BaseCache):
+    """
+    Двухуровневый кэш для нескольких воркеров и узлов.
+
+    L1 - SimpleCache в памяти процесса с коротким временем жизни, L2 - общий
+    Redis (или совместимый сервер, см. resp_server.py). Запись и удаление идут
+    в оба уровня, после чего ключ публикуется в канал channel, и остальные
+    процессы удаляют его из своего L1. Если сообщение потеряно (например, при
+    переподключении), устаревшее значение живет в L1 не дольше l1_timeout.
+
+    Недоступность Redis не ломает запросы: ошибка L2 пишется в лог, кэш
+    работает только на L1, а следующая попытка обратиться к L2 будет не раньше
+    чем через retry_interval секунд.
+    """
+
+    def __init__(self, redis_url='redis://localhost:6379/0', key_prefix='filmora:', l1_timeout=30,
+                 l1_threshold=500, default_timeout=300, channel='filmora:cache:invalidate',
+                 socket_timeout=1, retry_interval=5):
+        if redis is None:
+            raise RuntimeError('Для общего кэша нужен пакет redis')
+        BaseCache.__init__(self, default_timeout=default_timeout)
+        self.client = redis.from_url(redis_url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+        self.l2 = RedisCache(host=self.client, key_prefix=key_prefix, default_timeout=default_timeout)
+        self.l1 = SimpleCache(threshold=l1_threshold, default_timeout=l1_timeout)
+        self.l1_timeout = l1_timeout
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self._l2_down_until = 0
+        self.node_id = uuid.uuid4().hex
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+
+        thread = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+        thread.start()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            dict(
+                redis_url=config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+                key_prefix=config.get('CACHE_KEY_PREFIX') or 'filmora:',
+                l1_timeout=config.get('CACHE_L1_TIMEOUT', 30),
+                l1_threshold=config['CACHE_THRESHOLD'],
+            )
+        )
+        return cls(*args, **kwargs)
+
+    def _l1_timeout(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return self.l1_timeout if timeout == 0 else min(timeout, self.l1_timeout)
+
+    def _call_l2(self, method, *args, default=None):
+        """Вызывает метод L2; при ошибке Redis возвращает default и на время отключает L2"""
+        if time.monotonic() < self._l2_down_until:
+            return default
+        try:
+            return getattr(self.l2, method)(*args)
+        except redis.RedisError as e:
+            logger.error(f"Shared cache unavailable, using L1 only: {str(e)}")
+            self._l2_down_until = time.monotonic() + self.retry_interval
+            return default
+
+    def _publish(self, key):
+        if time.monotonic() < self._l2_down_until:
+            return
+        try:
+            self.client.publish(self.channel, f'{self.node_id} {key}')
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {str(e)}")
+
+    def _listen(self):
+        """Получает инвалидации от других процессов и удаляет ключи из L1"""
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    node_id, _, key = message['data'].decode('utf-8').partition(' ')
+                    if node_id == self.node_id:
+                        continue
+                    if key == '*':
+                        self.l1.clear()
+                    else:
+                        self.l1.delete(key)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {str(e)}")
+                # Пока подписки не было, инвалидации могли потеряться
+                self.l1.clear()
+                threading.Event().wait(self.retry_interval)
+            finally:
+                pubsub.close()
+
+    def get(self, key):
+        value = self.l1.get(key)
+        if value is not None:
+            self.stats['l1_hits'] += 1
+            return value
+        value = self._call_l2('get', key)
+        if value is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['l2_hits'] += 1
+        self.l1.set(key, value, timeout=self.l1_timeout)
+        return value
+
+    def get_many(self, *keys):
+        return [self.get(key) for key in keys]
+
+    def has(self, key):
+        return self.l1.has(key) or self._call_l2('has', key, default=False)
+
+    def set(self, key, value, timeout=None):
+        result = self._call_l2('set', key, value, timeout, default=False)
+        self.l1.set(key, value, timeout=self._l1_timeout(timeout))
+        self._publish(key)
+        return result
+
+    def add(self, key, value, timeout=None):
+        added = self._call_l2('add', key, value, timeout)
+        if added is None:
+            # Без L2 атомарность add обеспечивает только L1 этого процесса
+            return self.l1.add(key, value, timeout=self._l1_timeout(timeout))
+        if added:
+            self.l1.set(key, value, timeout=self._l1_timeout(timeout))
+            self._publish(key)
+        return added
+
+    def set_many(self, mapping, timeout=None):
+        for key, value in mapping.items():
+            self.set(key, value, timeout=timeout)
+        return list(mapping)
+
+    def delete(self, key):
+        self.l1.delete(key)
+        result = self._call_l2('delete', key, default=False)
+        self._publish(key)
+        return result
+
+    def delete_many(self, *keys):
+        return [key for key in keys if self.delete(key)]
+
+    def clear(self):
+        self.l1.clear()
+        result = self._call_l2('clear', default=False)
+        self._publish('*')
+        return result
+
+    def inc(self, key, delta=1):
+        # Счетчики живут только в L2, чтобы все процессы видели одно значение
+        self.l1.delete(key)
+        value = self._call_l2('inc', key, delta)
+        self._publish(key)
+        return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
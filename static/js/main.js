@@ -1,3 +1,6 @@
+// Каталог со статическими снимками лент
+const SNAPSHOT_BASE = 'snapshots';
+
 document.addEventListener('DOMContentLoaded', async function() {
     const searchInput = document.getElementById('searchInput');
     const searchButton = document.getElementById('searchButton');
@@ -14,6 +17,13 @@ document.addEventListener('DOMContentLoaded', async function() {
     let currentStreamData = null;
     let currentCategory = 'now';
     let currentMirror = 'https://hdrezka.ag';
+    let currentLoad = null;
+    const pendingExtra = new Set();
+    let snapshotManifest;
+    let extraTimer = null;
+    // Через сколько после наведения читать прогретые данные и сколько раз повторять
+    const EXTRA_DELAY = 1000;
+    const EXTRA_ATTEMPTS = 3;
 
     // Функция для проверки доступности зеркала
     async function checkMirror(url) {
@@ -77,6 +87,13 @@ document.addEventListener('DOMContentLoaded', async function() {
 
     // Загрузка фильмов по категории
     async function loadMovies(category, query = '') {
+        // Прерываем предыдущую загрузку, чтобы ее карточки не попали в новый список
+        if (currentLoad) {
+            currentLoad.abort();
+        }
+        const load = new AbortController();
+        currentLoad = load;
+
         try {
             // Показываем индикатор загрузки
             moviesContainer.innerHTML = `
@@ -86,52 +103,46 @@ document.addEventListener('DOMContentLoaded', async function() {
                 </div>
             `;
 
+            // Сначала пробуем готовый статический снимок ленты
+            const snapshot = await loadSnapshot(category, query, load.signal);
+            if (snapshot) {
+                displayMovies(snapshot);
+                return;
+            }
+
             // Проверяем и обновляем зеркало если текущее недоступно
             if (!await checkMirror(currentMirror)) {
                 currentMirror = await getWorkingMirror();
             }
 
-            let url = `${currentMirror}/${category}`;
+            let url = `${currentMirror}/stream/${category}`;
             if (category === 'search' && query) {
                 url = `${url}?query=${encodeURIComponent(query)}`;
             }
 
-            const response = await fetch(url);
+            const response = await fetch(url, { signal: load.signal });
             if (!response.ok) {
                 throw new Error('Ошибка при получении данных');
             }
-            
-            const movies = await response.json();
-            
-            moviesContainer.innerHTML = movies.map(movie => `
-                <div class="movie-card" data-url="${movie.url}">
-                    <div class="movie-poster-wrapper">
-                        <img src="${movie.poster || '/static/images/no-poster.svg'}" 
-                             alt="${movie.title}" 
-                             class="movie-poster"
-                             onerror="this.src='/static/images/no-poster.svg'">
-                    </div>
-                    <div class="movie-info">
-                        <h3 class="movie-title">${movie.title}</h3>
-                        <div class="movie-meta">
-                            ${movie.year ? `<span class="movie-year">${movie.year}</span>` : ''}
-                            ${movie.rating ? `<span class="movie-rating">${movie.rating}</span>` : ''}
-                        </div>
-                    </div>
-                </div>
-            `).join('');
-
-            // Добавляем обработчики для каждой карточки
-            document.querySelectorAll('.movie-card').forEach(card => {
-                const url = card.dataset.url;
-                card.addEventListener('click', () => {
-                    if (url) {
-                        openMovieModal(url);
-                    }
-                });
+
+            // Карточки отображаются по мере поступления строк NDJSON
+            let count = 0;
+            await readMovieStream(response, movie => {
+                if (count === 0) {
+                    moviesContainer.innerHTML = '';
+                }
+                appendMovieCard(movie);
+                count++;
             });
+
+            if (count === 0) {
+                displayMovies([]);
+            }
             
         } catch (error) {
+            if (error.name === 'AbortError') {
+                return;
+            }
             console.error('Error loading movies:', error);
             moviesContainer.innerHTML = `
                 <div class="error">
@@ -139,51 +150,203 @@ document.addEventListener('DOMContentLoaded', async function() {
                     <button onclick="window.location.reload()">Попробовать снова</button>
                 </div>
             `;
+        } finally {
+            if (currentLoad === load) {
+                currentLoad = null;
+            }
         }
     }
 
-    // Отображение фильмов
-    function displayMovies(movies) {
-        if (!movies || movies.length === 0) {
-            moviesContainer.innerHTML = '<div class="no-results">Ничего не найдено</div>';
+    // Манифест статических снимков (см. export_snapshots.py)
+    async function getSnapshotManifest() {
+        if (snapshotManifest === undefined) {
+            try {
+                const response = await fetch(`${SNAPSHOT_BASE}/manifest.json`, { cache: 'no-cache' });
+                snapshotManifest = response.ok ? await response.json() : null;
+            } catch {
+                snapshotManifest = null;
+            }
+        }
+        return snapshotManifest;
+    }
+
+    // Загрузка ленты из снимка; null, если снимка нет или он устарел
+    async function loadSnapshot(category, query, signal) {
+        const manifest = await getSnapshotManifest();
+        if (!manifest) {
+            return null;
+        }
+        if (Date.now() / 1000 - manifest.generated_at > manifest.max_age) {
+            // Перечитаем манифест при следующей загрузке
+            snapshotManifest = undefined;
+            return null;
+        }
+
+        const path = category === 'search'
+            ? manifest.search[query.toLowerCase().split(/\s+/).filter(Boolean).join(' ')]
+            : manifest.feeds[category];
+        if (!path) {
+            return null;
+        }
+
+        try {
+            const response = await fetch(`${SNAPSHOT_BASE}/${path}`, { signal });
+            const movies = response.ok ? await response.json() : null;
+            // Пустой снимок считаем промахом и идем в живой API
+            return Array.isArray(movies) && movies.length > 0 ? movies : null;
+        } catch (error) {
+            if (error.name === 'AbortError') {
+                throw error;
+            }
+            return null;
+        }
+    }
+
+    // Чтение потока NDJSON: каждая строка - одна карточка фильма
+    async function readMovieStream(response, onMovie) {
+        const handleLine = line => {
+            if (!line.trim()) {
+                return;
+            }
+            const data = JSON.parse(line);
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            onMovie(data);
+        };
+
+        // Без поддержки потоков читаем ответ целиком
+        if (!response.body || !window.TextDecoder) {
+            (await response.text()).split('\n').forEach(handleLine);
             return;
         }
-        
-        const movieElements = movies.map(movie => `
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffer + decoder.decode());
+    }
+
+    // Разметка карточки фильма
+    function createMovieCard(movie) {
+        return `
             <div class="movie-card" data-url="${movie.url}">
                 <div class="movie-poster-wrapper">
                     <img src="${movie.poster || '/static/images/no-poster.svg'}" 
                          alt="${movie.title}" 
                          class="movie-poster"
                          onerror="this.src='/static/images/no-poster.svg'">
-                    ${movie.quality ? `<div class="movie-quality quality-${movie.quality.toLowerCase()}">${movie.quality}</div>` : ''}
-                    <div class="movie-hover-info">
-                        <h3 class="movie-title">${movie.title}</h3>
-                        <div class="movie-meta">
-                            ${movie.year ? `<span class="movie-year">${movie.year}</span>` : ''}
-                            ${movie.rating ? `<span class="movie-rating">${movie.rating}</span>` : ''}
-                        </div>
-                        <button class="watch-button">Смотреть</button>
+                </div>
+                <div class="movie-info">
+                    <h3 class="movie-title">${movie.title}</h3>
+                    <div class="movie-meta">
+                        ${movie.year ? `<span class="movie-year">${movie.year}</span>` : ''}
+                        ${movie.rating ? `<span class="movie-rating">${movie.rating}</span>` : ''}
                     </div>
                 </div>
             </div>
-        `);
-        
-        moviesContainer.innerHTML = `
-            <div class="movies-grid">
-                ${movieElements.join('')}
-            </div>
         `;
-        
-        // Добавляем обработчики для каждой карточки
-        document.querySelectorAll('.movie-card').forEach(card => {
-            card.addEventListener('click', () => {
-                const url = card.dataset.url;
-                if (url) {
-                    openMovieModal(url);
+    }
+
+    // Добавление карточки в конец списка
+    function appendMovieCard(movie) {
+        moviesContainer.insertAdjacentHTML('beforeend', createMovieCard(movie));
+        const card = moviesContainer.lastElementChild;
+        card.addEventListener('click', () => {
+            const url = card.dataset.url;
+            if (url) {
+                openMovieModal(url);
+            }
+        });
+        card.addEventListener('mouseenter', () => requestMovieExtra(card), { once: true });
+    }
+
+    // При наведении отправляем подсказку (данные загружаются в фоне с низким приоритетом),
+    // а затем одним пакетным запросом читаем из кэша то, что успело загрузиться
+    function requestMovieExtra(card) {
+        const url = card.dataset.url;
+        if (!url) {
+            return;
+        }
+        fetch(`${currentMirror}/movie/details/prefetch?url=${encodeURIComponent(url)}`).catch(() => {});
+        card.dataset.extraAttempts = 0;
+        scheduleMovieExtra(card);
+    }
+
+    function scheduleMovieExtra(card) {
+        pendingExtra.add(card);
+        clearTimeout(extraTimer);
+        extraTimer = setTimeout(loadMovieExtra, EXTRA_DELAY);
+    }
+
+    async function loadMovieExtra() {
+        const cards = [...pendingExtra].slice(0, 20);
+        cards.forEach(card => pendingExtra.delete(card));
+        if (cards.length === 0) {
+            return;
+        }
+
+        try {
+            const params = cards.map(card => `url=${encodeURIComponent(card.dataset.url)}`).join('&');
+            const response = await fetch(`${currentMirror}/movie/details/batch?cached=1&${params}`);
+            const data = await response.json();
+            (data.results || []).forEach(item => {
+                const card = cards.find(card => card.dataset.url === item.url);
+                if (!card) {
+                    return;
+                }
+                if (item.details) {
+                    renderMovieExtra(card, item.details);
+                } else if (item.status === 'pending' && ++card.dataset.extraAttempts < EXTRA_ATTEMPTS) {
+                    // Подсказка еще выполняется - проверим кэш позже
+                    scheduleMovieExtra(card);
+                } else {
+                    // Подсказку отклонили или загрузка не удалась - попробуем при следующем наведении
+                    card.addEventListener('mouseenter', () => requestMovieExtra(card), { once: true });
                 }
             });
-        });
+        } catch (error) {
+            console.error('Error loading movie details:', error);
+        }
+
+        if (pendingExtra.size > 0) {
+            clearTimeout(extraTimer);
+            extraTimer = setTimeout(loadMovieExtra, EXTRA_DELAY);
+        }
+    }
+
+    function renderMovieExtra(card, details) {
+        const meta = card.querySelector('.movie-meta');
+        const parts = [details.type === 'series' ? 'Сериал' : 'Фильм'];
+        const translations = Object.keys(details.translations || {}).length;
+        if (translations > 1) {
+            parts.push(`озвучек: ${translations}`);
+        }
+        if (details.seasons && details.seasons.length) {
+            parts.push(`сезонов: ${details.seasons.length}`);
+        }
+        meta.insertAdjacentHTML('beforeend', `<span class="movie-extra">${parts.join(' · ')}</span>`);
+    }
+
+    // Отображение фильмов
+    function displayMovies(movies) {
+        if (!movies || movies.length === 0) {
+            moviesContainer.innerHTML = '<div class="no-results">Ничего не найдено</div>';
+            return;
+        }
+        
+        moviesContainer.innerHTML = '';
+        movies.forEach(appendMovieCard);
     }
 
     // Открытие модального окна с фильмом